@@ -1,29 +1,34 @@
 import streamlit as st
 import pandas as pd
-import qrcode
-import io
-from PIL import Image
 import os
-import tempfile
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as XLImage
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-import sqlite3
-from datetime import datetime
-import base64
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from supabase import create_client
-import json
 from dotenv import load_dotenv
+from qr_utils import COLUMN_DTYPES, COLUMN_MAPPING, create_excel_with_qr_codes, render_qr_png
+from styles import CUSTOM_CSS
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
-supabase = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
+# Initialize Supabase client once per server process, not on every rerun
+@st.cache_resource(show_spinner=False)
+def get_supabase_client():
+    return create_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_KEY")
+    )
+
+supabase = get_supabase_client()
+
+# Rows sent per insert request, keeps large imports under the API request size limit
+INSERT_BATCH_SIZE = 1000
+
+# QR workers are forked from a forkserver, never from the multi-threaded Streamlit
+# server itself; the server preloads qr_utils so new workers start warm
+QR_POOL_CONTEXT = multiprocessing.get_context("forkserver")
+QR_POOL_CONTEXT.set_forkserver_preload(["qr_utils"])
+QR_POOL_WORKERS = os.cpu_count() or 1
 
 # Page configuration
 st.set_page_config(
@@ -34,86 +39,18 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-    <style>
-    .main {
-        padding: 2rem;
-    }
-    .stButton>button {
-        width: 100%;
-        background-color: #366092;
-        color: white;
-        border-radius: 5px;
-        padding: 0.5rem 1rem;
-        border: none;
-    }
-    .stButton>button:hover {
-        background-color: #2d4d7a;
-    }
-    .search-box {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 5px;
-        margin-bottom: 1rem;
-    }
-    .success-box {
-        background-color: #d4edda;
-        padding: 1rem;
-        border-radius: 5px;
-        margin-bottom: 1rem;
-    }
-    .data-box {
-        background-color: #ffffff;
-        padding: 1rem;
-        border-radius: 5px;
-        margin-bottom: 1rem;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    .metric-box {
-        background-color: #f8f9fa;
-        padding: 1rem;
-        border-radius: 5px;
-        margin: 0.5rem;
-        text-align: center;
-    }
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 2rem;
-    }
-    .stTabs [data-baseweb="tab"] {
-        height: 4rem;
-        white-space: pre-wrap;
-        background-color: #f0f2f6;
-        border-radius: 4px 4px 0 0;
-        gap: 1rem;
-        padding-top: 10px;
-        padding-bottom: 10px;
-    }
-    .stTabs [aria-selected="true"] {
-        background-color: #366092;
-        color: white;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-
-# Column mapping
-COLUMN_MAPPING = {
-    "PH": "ph",
-    "DTR": "dtr",
-    "nombre de planche": "nombre_planche",
-    "numero de planche": "numero_planche",
-    "ligne": "ligne",
-    "position": "position",
-    "niveau": "niveau"
-}
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
+# Streamlit reruns the whole script on every widget event, so keep the
+# table around for a short while instead of downloading it each time.
+# Errors are left to the caller: st.cache_data does not cache exceptions,
+# so a failed fetch is retried on the next rerun instead of replayed.
+@st.cache_data(ttl=60, show_spinner=False)
 def get_all_records():
-    try:
-        response = supabase.table('emplacements').select("*").execute()
-        return pd.DataFrame(response.data)
-    except Exception as e:
-        st.error(f"Erreur lors de la récupération des données: {str(e)}")
-        return pd.DataFrame()
+    response = supabase.table('emplacements').select("*").execute()
+    return pd.DataFrame(response.data)
 
+@st.cache_data(show_spinner=False)
 def get_statistics(df):
     if df.empty:
         return {
@@ -131,64 +68,20 @@ def get_statistics(df):
     }
     return stats
 
-def create_qr_code(data, filename, size=200):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    qr_image = qr.make_image(fill_color="black", back_color="white")
-    qr_image = qr_image.resize((size, size), Image.Resampling.LANCZOS)
-    temp_dir = tempfile.mkdtemp()
-    filepath = os.path.join(temp_dir, filename)
-    qr_image.save(filepath, format="PNG", quality=95)
-    return filepath
-
-def create_excel_with_qr_codes(data, filename, is_emplacement=True):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Emplacements" if is_emplacement else "Planches"
-    
-    header_font = Font(bold=True, size=12, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+# Aggregated in Postgres by qr_stats() (see sql/qr_stats.sql) so the sidebar
+# gets four numbers instead of downloading the whole table
+@st.cache_data(ttl=60, show_spinner=False)
+def get_server_statistics():
+    response = supabase.rpc('qr_stats', {}).execute()
+    data = response.data
     
-    headers = ['PH', 'DTR', 'QR Code'] if is_emplacement else ['Ligne', 'Position', 'Niveau', 'QR Code']
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = thin_border
-        ws.column_dimensions[get_column_letter(col)].width = 20
-    
-    for row_idx, row_data in enumerate(data, 2):
-        for col_idx, value in enumerate(row_data[:-1], 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            cell.value = value
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = thin_border
-        
-        qr_path = row_data[-1]
-        img = XLImage(qr_path)
-        qr_col = len(headers)
-        cell = ws.cell(row=row_idx, column=qr_col)
-        ws.row_dimensions[row_idx].height = 150
-        ws.add_image(img, f"{get_column_letter(qr_col)}{row_idx}")
-    
-    ws.column_dimensions[get_column_letter(len(headers))].width = 30
-    wb.save(filename)
-    return filename
+    stats = {
+        "Total Records": data['total'],
+        "Unique PH": data['unique_ph'],
+        "Unique DTR": data['unique_dtr'],
+        "Total Planches": data['total_planches']
+    }
+    return stats
 
 def search_records(ph=None, dtr=None):
     try:
@@ -211,11 +104,14 @@ with st.sidebar:
     st.markdown("## Menu")
     st.markdown("---")
     
+    if st.button("🔄 Actualiser les données"):
+        get_all_records.clear()
+        get_server_statistics.clear()
+    
     # Quick stats in sidebar
     try:
-        all_data = get_all_records()
-        if not all_data.empty:
-            stats = get_statistics(all_data)
+        stats = get_server_statistics()
+        if stats["Total Records"]:
             st.markdown("### 📊 Statistiques rapides")
             for key, value in stats.items():
                 st.metric(label=key, value=value)
@@ -234,101 +130,95 @@ with tab1:
     
     if uploaded_file is not None:
         try:
-            df = pd.read_excel(uploaded_file)
+            # Read only the header row first so an invalid file is rejected without a full parse
+            columns = pd.read_excel(uploaded_file, nrows=0).columns
             required_columns = list(COLUMN_MAPPING.keys())
             
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in required_columns if col not in columns]
             
             if missing_columns:
                 st.error(f"Colonnes manquantes: {', '.join(missing_columns)}")
             else:
+                uploaded_file.seek(0)
+                df = pd.read_excel(uploaded_file, usecols=required_columns, dtype=COLUMN_DTYPES)
+                
                 # Rename columns to match database schema
                 df = df.rename(columns=COLUMN_MAPPING)
                 
-                # Save to Supabase
-                for _, row in df.iterrows():
-                    data = row.to_dict()
-                    supabase.table('emplacements').insert(data).execute()
+                # Save to Supabase in batches of INSERT_BATCH_SIZE rows; missing cells become NULL
+                records = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+                for start in range(0, len(records), INSERT_BATCH_SIZE):
+                    supabase.table('emplacements').insert(records[start:start + INSERT_BATCH_SIZE]).execute()
                 
+                get_all_records.clear()
+                get_server_statistics.clear()
                 st.success("Données importées avec succès!")
                 
                 # Generate QR codes and Excel files
-                temp_dir = tempfile.mkdtemp()
-                emplacement_data = []
-                planche_data = []
+                # Build QR payloads column-wise instead of row by row.
+                # Missing cells print as empty values in every column, not "nan" or "<NA>".
+                text = df.astype("string").fillna("")
+                planche_qr_data = (
+                    "ligne:" + text['ligne']
+                    + "\nposition:" + text['position']
+                    + "\nniveau:" + text['niveau']
+                )
+                emplacement_qr_data = (
+                    "PH:" + text['ph']
+                    + "\nDTR:" + text['dtr']
+                    + "\nnb_planche:" + text['nombre_planche']
+                    + "\nnum_planche:" + text['numero_planche']
+                    + "\n" + planche_qr_data
+                ).to_numpy()
+                planche_qr_data = planche_qr_data.to_numpy()
                 
-                for index, row in df.iterrows():
-                    emplacement_qr_data = f"PH:{row['ph']}\nDTR:{row['dtr']}\nnb_planche:{row['nombre_planche']}\nnum_planche:{row['numero_planche']}\nligne:{row['ligne']}\nposition:{row['position']}\nniveau:{row['niveau']}"
-                    emplacement_qr_path = create_qr_code(emplacement_qr_data, f"emplacement_{index}.png")
-                    
-                    emplacement_data.append([
-                        row['ph'],
-                        row['dtr'],
-                        emplacement_qr_path
-                    ])
-                    
-                    planche_qr_data = f"ligne:{row['ligne']}\nposition:{row['position']}\nniveau:{row['niveau']}"
-                    planche_qr_path = create_qr_code(planche_qr_data, f"planche_{index}.png")
-                    
-                    planche_data.append([
-                        row['ligne'],
-                        row['position'],
-                        row['niveau'],
-                        planche_qr_path
-                    ])
+                # QR encoding is CPU-bound, spread it across all cores.
+                # Payloads are sent in chunks so each PNG doesn't cost its own IPC round trip.
+                chunksize = max(1, len(df) // (4 * QR_POOL_WORKERS))
+                with ProcessPoolExecutor(max_workers=QR_POOL_WORKERS, mp_context=QR_POOL_CONTEXT) as executor:
+                    emplacement_qr_images = list(executor.map(render_qr_png, emplacement_qr_data, chunksize=chunksize))
+                    planche_qr_images = list(executor.map(render_qr_png, planche_qr_data, chunksize=chunksize))
                 
-                emplacement_file = create_excel_with_qr_codes(emplacement_data, "feuille_emplacement.xlsx", True)
-                planche_file = create_excel_with_qr_codes(planche_data, "feuille_planche.xlsx", False)
+                # Columns are handed over as-is, no per-row lists are built
+                emplacement_file = create_excel_with_qr_codes(df[['ph', 'dtr']], emplacement_qr_images, True)
+                planche_file = create_excel_with_qr_codes(df[['ligne', 'position', 'niveau']], planche_qr_images, False)
                 
                 col1, col2 = st.columns(2)
                 with col1:
-                    with open(emplacement_file, 'rb') as f:
-                        st.download_button(
-                            label="📥 Télécharger fichier Emplacements",
-                            data=f,
-                            file_name="feuille_emplacement.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                    st.download_button(
+                        label="📥 Télécharger fichier Emplacements",
+                        data=emplacement_file,
+                        file_name="feuille_emplacement.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
                 
                 with col2:
-                    with open(planche_file, 'rb') as f:
-                        st.download_button(
-                            label="📥 Télécharger fichier Planches",
-                            data=f,
-                            file_name="feuille_planche.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-                
-                # Cleanup
-                for file in os.listdir(temp_dir):
-                    os.remove(os.path.join(temp_dir, file))
-                os.rmdir(temp_dir)
-                os.remove(emplacement_file)
-                os.remove(planche_file)
+                    st.download_button(
+                        label="📥 Télécharger fichier Planches",
+                        data=planche_file,
+                        file_name="feuille_planche.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
                 
         except Exception as e:
             st.error(f"Erreur lors du traitement: {str(e)}")
 
 with tab2:
     st.markdown("### Recherche de données")
-    st.markdown('<div class="search-box">', unsafe_allow_html=True)
-    
-    search_col1, search_col2 = st.columns(2)
-    with search_col1:
-        ph_search = st.text_input("Rechercher par PH")
-    with search_col2:
-        dtr_search = st.text_input("Rechercher par DTR")
     
-    if st.button("🔎 Rechercher"):
-        results = search_records(ph_search, dtr_search)
-        if not results.empty:
-            st.markdown('<div class="success-box">', unsafe_allow_html=True)
-            st.dataframe(results)
-            st.markdown('</div>', unsafe_allow_html=True)
-        else:
-            st.warning("Aucun résultat trouvé")
-    
-    st.markdown('</div>', unsafe_allow_html=True)
+    with st.container(border=True):
+        search_col1, search_col2 = st.columns(2)
+        with search_col1:
+            ph_search = st.text_input("Rechercher par PH")
+        with search_col2:
+            dtr_search = st.text_input("Rechercher par DTR")
+        
+        if st.button("🔎 Rechercher"):
+            results = search_records(ph_search, dtr_search)
+            if not results.empty:
+                st.dataframe(results)
+            else:
+                st.warning("Aucun résultat trouvé")
 
 with tab3:
     st.markdown("### Visualisation des données")
@@ -348,19 +238,15 @@ with tab3:
             
             # Data summary
             st.markdown("#### 📋 Résumé des données")
-            st.markdown('<div class="data-box">', unsafe_allow_html=True)
             st.dataframe(all_data.describe())
-            st.markdown('</div>', unsafe_allow_html=True)
             
             # Full data view
             st.markdown("#### 📋 Toutes les données")
-            st.markdown('<div class="data-box">', unsafe_allow_html=True)
             st.dataframe(all_data)
-            st.markdown('</div>', unsafe_allow_html=True)
         else:
             st.info("Aucune donnée disponible dans la base de données")
     except Exception as e:
-        st.warning("Erreur lors de la récupération des données")
+        st.error(f"Erreur lors de la récupération des données: {str(e)}")
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,155 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+import qrcode
+import xlsxwriter
+from PIL import Image
+
+
+# Column mapping
+COLUMN_MAPPING = {
+    "PH": "ph",
+    "DTR": "dtr",
+    "nombre de planche": "nombre_planche",
+    "numero de planche": "numero_planche",
+    "ligne": "ligne",
+    "position": "position",
+    "niveau": "niveau"
+}
+
+# Explicit types for the input columns so read_excel skips type inference
+COLUMN_DTYPES = {
+    "PH": str,
+    "DTR": str,
+    "nombre de planche": "Int64",
+    "numero de planche": "Int64",
+    "ligne": str,
+    "position": str,
+    "niveau": str
+}
+
+
+# Cell styles of the generated sheets. xlsxwriter formats belong to a workbook,
+# so each export registers these once and every cell shares the same format
+HEADER_FORMAT = {
+    'bold': True,
+    'font_size': 12,
+    'font_color': 'white',
+    'bg_color': '#366092',
+    'align': 'center',
+    'valign': 'vcenter',
+    'border': 1
+}
+CELL_FORMAT = {
+    'align': 'center',
+    'valign': 'vcenter',
+    'border': 1
+}
+
+# Rendered PNGs are kept here across imports and sessions, keyed by payload.
+# Bump QR_CACHE_VERSION whenever the rendering below changes.
+# Nothing is ever evicted (about 1 KB per distinct payload), so the directory
+# grows with every new label printed; deleting it at any time is safe.
+QR_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "phqrcode")
+QR_CACHE_VERSION = 2
+
+# One encoder per process, reset between payloads instead of rebuilt for each.
+# Pool workers are forked from a forkserver that preloads this module, so each
+# worker owns a private copy.
+_QR = qrcode.QRCode(
+    version=1,
+    error_correction=qrcode.constants.ERROR_CORRECT_H,
+    border=4
+)
+
+
+def _encode_qr_png(data, size):
+    qr = _QR
+    qr.clear()
+    # best_fit() starts from the current version, so restart from 1 or a
+    # long payload would inflate every QR code rendered after it
+    qr.version = 1
+    qr.add_data(data)
+    qr.make(fit=True)
+    # Pick the module size from the fitted version so the image is rendered
+    # at (about) the target size directly, with no resampling pass
+    box_size = max(1, size // (qr.modules_count + 2 * qr.border))
+    # Rasterize with numpy in one pass instead of drawing every module through
+    # qr.make_image(); True is white in a 1-bit image, and the quiet zone is white
+    light = np.pad(~np.asarray(qr.modules, dtype=bool), qr.border, constant_values=True)
+    raster = np.kron(light, np.ones((box_size, box_size), dtype=bool))
+    # Whole-pixel modules leave the raster short of the target; widen the white
+    # margin so every image is exactly size x size, whatever the QR version
+    extra = max(0, size - raster.shape[0])
+    raster = np.pad(raster, (extra // 2, extra - extra // 2), constant_values=True)
+    qr_image = Image.fromarray(raster)
+    buffer = io.BytesIO()
+    qr_image.save(buffer, format="PNG", optimize=False, compress_level=1)
+    return buffer.getvalue()
+
+
+# Kept outside app.py so ProcessPoolExecutor workers can resolve it by name:
+# Streamlit executes app.py as a script, which child processes cannot unpickle from.
+def render_qr_png(data, size=200):
+    key = hashlib.sha1(f"{QR_CACHE_VERSION}:{size}:{data}".encode("utf-8")).hexdigest()
+    cache_path = os.path.join(QR_CACHE_DIR, key + ".png")
+    try:
+        with open(cache_path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    
+    png = _encode_qr_png(data, size)
+    
+    # Write to a temp file then rename, so concurrent workers never read a partial PNG.
+    # The cache is only an optimization: if the directory is not writable, just skip it.
+    try:
+        os.makedirs(QR_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=QR_CACHE_DIR, suffix=".tmp")
+    except OSError:
+        return png
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Don't leave a stray partial file behind (disk full, permissions changed)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+    return png
+
+
+def create_excel_with_qr_codes(table, qr_images, is_emplacement=True):
+    sheet_name = "Emplacements" if is_emplacement else "Planches"
+    headers = ['PH', 'DTR', 'QR Code'] if is_emplacement else ['Ligne', 'Position', 'Niveau', 'QR Code']
+    qr_col = len(headers) - 1
+    
+    # Missing values are written as bordered blank cells
+    table = table.astype(object).where(table.notna(), None)
+    
+    # Built in memory and returned as bytes, ready for st.download_button
+    buffer = io.BytesIO()
+    with xlsxwriter.Workbook(buffer, {'in_memory': True}) as wb:
+        ws = wb.add_worksheet(sheet_name)
+        header_format = wb.add_format(HEADER_FORMAT)
+        cell_format = wb.add_format(CELL_FORMAT)
+        
+        ws.write_row(0, 0, headers, header_format)
+        ws.set_column(0, qr_col - 1, 20)
+        ws.set_column(qr_col, qr_col, 30)
+        
+        # One call per column for the text data; only the images need a per-row loop.
+        # The format goes on the written cells only, not the whole column.
+        for col_idx in range(qr_col):
+            ws.write_column(1, col_idx, table.iloc[:, col_idx], cell_format)
+        
+        for row_idx, qr_image in enumerate(qr_images, 1):
+            ws.set_row(row_idx, 150)
+            ws.insert_image(row_idx, qr_col, f"qr_{row_idx}.png", {'image_data': io.BytesIO(qr_image)})
+    
+    return buffer.getvalue()
@@ -0,0 +1,15 @@
+-- Aggregates used by the statistics panels of app.py.
+-- Run once in the Supabase SQL editor; called through supabase.rpc("qr_stats").
+create or replace function qr_stats()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'total', count(*),
+        'unique_ph', count(distinct ph),
+        'unique_dtr', count(distinct dtr),
+        'total_planches', coalesce(sum(nombre_planche), 0)
+    )
+    from emplacements;
+$$;
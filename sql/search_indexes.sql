@@ -0,0 +1,11 @@
+-- Indexes backing search_records() in app.py.
+-- The search uses ilike '%...%', which a plain B-tree index cannot serve;
+-- trigram GIN indexes let Postgres answer it without scanning the table.
+-- Run once in the Supabase SQL editor.
+create extension if not exists pg_trgm;
+
+create index if not exists emplacements_ph_trgm_idx
+    on emplacements using gin (ph gin_trgm_ops);
+
+create index if not exists emplacements_dtr_trgm_idx
+    on emplacements using gin (dtr gin_trgm_ops);